@@ -3,16 +3,19 @@
 
 import random
 import sys
+from collections import deque
 
-from PyQt5.QtCore import QBasicTimer
+from PyQt5.QtCore import QRect
+from PyQt5.QtCore import QTimer
 from PyQt5.QtCore import Qt
 from PyQt5.QtCore import pyqtSignal
 from PyQt5.QtGui import QColor
 from PyQt5.QtGui import QPainter
+from PyQt5.QtGui import QPixmap
+from PyQt5.QtGui import QRegion
 from PyQt5.QtWidgets import QFrame
 from PyQt5.QtWidgets import QMainWindow
 from PyQt5.QtWidgets import QApplication
-from copy import copy
 
 
 class Game(QMainWindow):
@@ -46,7 +49,7 @@ class CollisionError(Exception):
 class Board(QFrame):
     """
     The board class draws the board on which the snake moves. Also the snake itself, food and the enemies.
-    The board is managed with squares which move each time the timer event is called. The size and amount of these
+    The board is managed with squares which move each time the timer times out. The size and amount of these
     squares are also defined in this class. Always if the second food was eaten, there will spawn an additional enemy.
     """
     msg_status_bar = pyqtSignal(str)
@@ -54,84 +57,188 @@ class Board(QFrame):
     board_size = 50
     playing = False
     speed = 50
+    _BACKGROUND = QColor("lightgray")
+    _BLACK = QColor("black")
+    _RED = QColor("red")
+    _GREEN = QColor("green")
+    _KEY_DIRECTIONS = {Qt.Key_Up: 1, Qt.Key_Right: 2, Qt.Key_Down: 3, Qt.Key_Left: 4}
+    _OPPOSITE = {1: 3, 2: 4, 3: 1, 4: 2}
 
     def __init__(self, parent):
         super().__init__()
-        self._timer = QBasicTimer()
+        self._timer = QTimer(self)
+        self._timer.setTimerType(Qt.PreciseTimer)
+        self._timer.timeout.connect(self._tick)
         self._new_direction = 2
         self._enemies = []
-        self._food = {"x": 0, "y": 0}
+        self._food = (0, 0)
         self._snake = None
+        # Bitmask of the cells in a row on which food and enemies may be placed, all except the first one.
+        self._placeable = (1 << self.board_size) - 2
+        self._rows = []
         self._rand = random.Random()
+        self._backing = QPixmap(self.board_size * self.pxl_block_size, self.board_size * self.pxl_block_size)
+        self._square_rects = self.square_rects()
+        self.setAttribute(Qt.WA_OpaquePaintEvent)
 
     def init_board(self):
-        self.setStyleSheet("background-color:lightgray;")
         self.setFocusPolicy(Qt.StrongFocus)
-        self._enemies = [{"x": 0, "y": 0}]
+        self._enemies = []
         self._new_direction = 2
         self._snake = Snake(self.board_size)
+        self._rows = [0] * self.board_size
+        for cell in self._snake.body:
+            self.occupy(cell)
         self.spread_food()
-        self.move_enemies()
+        self.move_enemies(1)
+        self.draw_board()
 
     def paintEvent(self, event):
         """
-        The paintEvent is called by the update() function. If the food was eaten since the last timer event,
-        new food will be spreaded and the enemies will be replaced randomly on the board.
+        The paintEvent is called by the update() function. The game is drawn into the backing pixmap,
+        so the part of it which has to be repainted is just copied onto the board.
         :param event:
         """
         painter = QPainter(self)
-        self.draw_snake(painter)
+        rect = event.rect()
+        painter.drawPixmap(rect, self._backing, rect)
 
+    def draw_board(self):
+        """
+        Draws the whole game into the backing pixmap: the background, the snake, the food and the enemies.
+        """
+        self._backing.fill(self._BACKGROUND)
+        painter = QPainter(self._backing)
+        painter.setPen(Qt.NoPen)
+        self.draw_squares(painter, self._snake.body, self._BLACK)
+        self.draw_squares(painter, [self._food], self._GREEN)
+        self.draw_squares(painter, self._enemies, self._RED)
+        painter.end()
+
+    def draw_move(self, tail):
+        """
+        Draws the squares which changed with the last move into the backing pixmap: the new head and either
+        the old tail or, if the food was eaten, the old and new places of the food and the enemies.
+        The food and the enemies are replaced here.
+        :param tail:
+        :return QRegion: the region which has to be repainted
+        """
+        painter = QPainter(self._backing)
+        painter.setPen(Qt.NoPen)
+        changed = [self._snake.head]
         if self._snake.eating:
-            self.spread_food()
-            if self._snake.body.__len__() % 2 == 0:
-                self._enemies.append({"x": 0, "y": 0})
-            self.move_enemies()
-            self._snake.eating = False
-
-        self.draw_square(painter, self._food["x"], self._food["y"], QColor("green"))
-        for enemy in self._enemies:
-            self.draw_square(painter, enemy["x"], enemy["y"], QColor("red"))
-
-    def draw_snake(self, painter):
-        for part in self._snake.body:
-            self.draw_square(painter, part["x"], part["y"], QColor("black"))
+            old = [self._food] + self._enemies
+            self.draw_squares(painter, old, self._BACKGROUND)
+            self.replace_food_and_enemies()
+            self.draw_squares(painter, [self._food], self._GREEN)
+            self.draw_squares(painter, self._enemies, self._RED)
+            changed += old + [self._food] + self._enemies
+        else:
+            self.draw_squares(painter, [tail], self._BACKGROUND)
+            changed.append(tail)
+        self.draw_squares(painter, [self._snake.head], self._BLACK)
+        painter.end()
+        return self.squares_region(changed)
 
-    def draw_square(self, painter, x, y, color):
+    def draw_squares(self, painter, cells, color):
         """
-        Draws a square by the coordinates and the block size configuration.
+        Draws the squares of all cells with one drawRects call.
         :param painter:
-        :param x:
-        :param y:
+        :param cells:
         :param color:
-        :return:
+        """
+        square_rects = self._square_rects
+        rects = [square_rects[cell] for cell in cells]
+        if rects:
+            painter.setBrush(color)
+            painter.drawRects(*rects)
+
+    def square_rects(self):
+        """
+        Returns the rectangles in pixels which are covered by the squares of the board, keyed by their coordinates.
+        The block size never changes, so the rectangles are computed once instead of on every draw.
+        :return dict:
         """
         block_size = self.pxl_block_size
-        painter.fillRect(x * block_size, y * block_size, block_size, block_size, color)
+        return {(x, y): QRect(x * block_size, y * block_size, block_size, block_size)
+                for x in range(self.board_size) for y in range(self.board_size)}
 
-    def enemy_forbidden_place(self, enemy):
+    def squares_region(self, cells):
         """
-        Return false if enemy has same coords as food or another enemy
-        and if its in the same direction as the snake's head.
-        :param enemy:
-        :return boolean:
+        Returns the region covered by the squares of all cells.
+        :param cells:
+        :return QRegion:
         """
-        return ((self._new_direction == 1 or 3) and enemy["y"] == self._snake.head["y"]) \
-               or ((self._new_direction == 2 or 4) and enemy["x"] == self._snake.head["x"]) \
-               or enemy == self._food \
-               or enemy == any(self._enemies)
+        region = QRegion()
+        for cell in cells:
+            region += self._square_rects[cell]
+        return region
+
+    def occupy(self, cell):
+        """
+        Marks the cell as covered by the snake, food or an enemy.
+        :param cell:
+        """
+        x, y = cell
+        self._rows[y] |= 1 << x
+
+    def vacate(self, cell):
+        """
+        Marks the cell as free.
+        :param cell:
+        """
+        x, y = cell
+        self._rows[y] &= ~(1 << x)
+
+    def free_masks(self):
+        """
+        Returns per row the bitmask of the free cells on which food and enemies may be placed.
+        The first row is left out.
+        :return list:
+        """
+        placeable = self._placeable
+        return [0] + [~row & placeable for row in self._rows[1:]]
+
+    def enemy_masks(self):
+        """
+        Returns per row the bitmask of the free cells which aren't in the same direction as the snake's head.
+        :return list:
+        """
+        masks = self.free_masks()
+        head_x, head_y = self._snake.head
+        if self._new_direction in (1, 3):
+            masks[head_y] = 0
+        else:
+            column = ~(1 << head_x)
+            masks = [mask & column for mask in masks]
+        return masks
+
+    def random_cells(self, masks, count):
+        """
+        Returns count distinct random cells out of the cells whose bits are set in the per row masks.
+        :param masks:
+        :param count:
+        :return list:
+        """
+        counts = [bin(mask).count("1") for mask in masks]
+        cells = []
+        for index in self._rand.sample(range(sum(counts)), count):
+            y = 0
+            while index >= counts[y]:
+                index -= counts[y]
+                y += 1
+            mask = masks[y]
+            for _ in range(index):
+                mask &= mask - 1
+            cells.append(((mask & -mask).bit_length() - 1, y))
+        return cells
 
     def keyPressEvent(self, event):
         key = event.key()
-        direction = self._snake.direction
-        if key == Qt.Key_Up and direction != 3:
-            self._new_direction = 1
-        elif key == Qt.Key_Right and direction != 4:
-            self._new_direction = 2
-        elif key == Qt.Key_Down and direction != 1:
-            self._new_direction = 3
-        elif key == Qt.Key_Left and direction != 2:
-            self._new_direction = 4
+        direction = self._KEY_DIRECTIONS.get(key)
+        if direction:
+            if self._OPPOSITE[direction] != self._snake.direction:
+                self._new_direction = direction
         elif key == Qt.Key_Q:
             self.stop()
         elif key == Qt.Key_R and not self.playing:
@@ -139,27 +246,40 @@ class Board(QFrame):
         else:
             return
 
-    def move_enemies(self):
+    def move_enemies(self, count):
+        """
+        Frees the cells of all enemies and places count enemies on distinct random free cells
+        which aren't in the same direction as the snake's head. The cells for all enemies are drawn at once.
+        :param count:
+        """
         for enemy in self._enemies:
-            while True:
-                enemy["x"] = self._rand.randint(1, self.board_size - 1)
-                enemy["y"] = self._rand.randint(1, self.board_size - 1)
-                if not self.enemy_forbidden_place(enemy):
-                    break
+            self.vacate(enemy)
+        self._enemies = self.random_cells(self.enemy_masks(), count)
+        for enemy in self._enemies:
+            self.occupy(enemy)
 
     def stop(self):
         self.msg_status_bar.emit("Game over! ----- Score: " +
-                                 str(self._snake.body.__len__() - self._snake.start_length) +
+                                 str(len(self._snake.body) - self._snake.start_length) +
                                  " ----- (Press 'r' to restart the game)")
         self.playing = False
         self._timer.stop()
 
+    def replace_food_and_enemies(self):
+        """
+        Called after the food was eaten. New food will be spreaded and the enemies will be replaced randomly
+        on the board. Always if the second food was eaten, an additional enemy is added.
+        """
+        self.spread_food()
+        count = len(self._enemies)
+        if len(self._snake.body) % 2 == 0:
+            count += 1
+        self.move_enemies(count)
+        self._snake.eating = False
+
     def spread_food(self):
-        while True:
-            self._food["x"] = self._rand.randint(1, self.board_size - 1)
-            self._food["y"] = self._rand.randint(1, self.board_size - 1)
-            if self._food != self._snake.head:
-                break
+        self._food = self.random_cells(self.free_masks(), 1)[0]
+        self.occupy(self._food)
 
     def start(self):
         """
@@ -168,22 +288,28 @@ class Board(QFrame):
         self.msg_status_bar.emit("Welcome to snake! (Press 'q' to quit the game)")
         self.init_board()
         self.playing = True
-        self._timer.start(self.speed, self)
+        self._timer.start(self.speed)
+        self.update()
 
-    def timerEvent(self, event):
+    def _tick(self):
         """
-        Throws exception if snake touched itself, the boarder or an enemy.
-        Otherwise the update() function will be called which repaints the game with new coords.
+        Called each time the timer times out. Stops the game if snake touched itself, the boarder or an enemy.
+        Otherwise the move is drawn into the backing pixmap and the update() function will be called with the
+        squares which changed since the last tick.
         """
-        if event.timerId() == self._timer.timerId():
-            self._snake.direction = self._new_direction
-            try:
-                self._snake.move(self._food, self._enemies)
-                self.update()
-            except CollisionError:
-                self.stop()
-        else:
-            super(Board, self).timerEvent(event)
+        self._snake.direction = self._new_direction
+        tail = self._snake.body[-1]
+        try:
+            self._snake.move(self._food, self._enemies)
+        except CollisionError:
+            self.stop()
+            return
+
+        self.occupy(self._snake.head)
+        if not self._snake.eating:
+            self.vacate(tail)
+
+        self.update(self.draw_move(tail))
 
 
 class Snake(object):
@@ -198,48 +324,50 @@ class Snake(object):
         4: "West"
     }
     start_length = 10
+    # Offsets of the head's coords per move, indexed by direction.
+    _DX = (0, 0, 1, 0, -1)
+    _DY = (0, -1, 0, 1, 0)
 
     def __init__(self, board_size):
         self._board_size = board_size
-        self.body = []
+        self.body = deque()
         self.direction = 2
         self.eating = False
 
         for i in reversed(range(self.start_length)):
-            self.body.append({"x": i + 2, "y": 2})
-        self.head = copy(self.body[0])
+            self.body.append((i + 2, 2))
+        self.head = self.body[0]
+        self._body_set = set(self.body)
 
     def grow(self):
         self.eating = True
-        self.body.append({
-            "x": self.body[len(self.body) - 1]["x"],
-            "y": self.body[len(self.body) - 1]["y"]})
 
     def check_head_touches_border(self):
-        if self.head["x"] == -1:
-            raise CollisionError()
-        if self.head["y"] == -1:
-            raise CollisionError()
-        if self.head["x"] == self._board_size:
-            raise CollisionError()
-        if self.head["y"] == self._board_size:
+        x, y = self.head
+        size = self._board_size
+        if not (0 <= x < size and 0 <= y < size):
             raise CollisionError()
 
     def check_head_touches_tail(self):
-        if any(p == self.head for p in self.body):
+        """
+        The head can't reach one of the first three parts behind it, so a snake shorter than four parts
+        can't touch its tail.
+        """
+        if len(self.body) >= 4 and self.head in self._body_set:
             raise CollisionError()
 
     def head_touches_food(self, food):
         return self.head == food
 
     def check_head_touches_enemy(self, enemies):
-        if any(e == self.head for e in enemies):
+        if self.head in enemies:
             raise CollisionError()
 
     def move(self, food, enemies):
         """
-        If the snake didn't collide, each part of the snake's body gets the coords of the body part ahead.
         The x- or y-axis of the snake's head will increment depending on the direction the snake is moving.
+        If the snake didn't collide, the new head is put in front of the body and the last part is dropped,
+        unless the snake is eating, in which case the body keeps its tail and grows by one part.
         :param food:
         :param enemies:
         """
@@ -249,26 +377,17 @@ class Snake(object):
         self.check_head_touches_tail()
         self.check_head_touches_enemy(enemies)
 
+        body = self.body
+        body.appendleft(self.head)
+        self._body_set.add(self.head)
         if self.head_touches_food(food):
             self.grow()
-
-        for index in reversed(range(self.body.__len__())):
-            if index == 0:
-                continue
-            self.body[index]["x"] = self.body[index - 1]["x"]
-            self.body[index]["y"] = self.body[index - 1]["y"]
-        self.body[0]["x"] = self.head["x"]
-        self.body[0]["y"] = self.head["y"]
+        else:
+            self._body_set.remove(body.pop())
 
     def set_head_position(self):
-        if self.direction == 1:
-            self.head["y"] -= 1
-        elif self.direction == 2:
-            self.head["x"] += 1
-        elif self.direction == 3:
-            self.head["y"] += 1
-        elif self.direction == 4:
-            self.head["x"] -= 1
+        x, y = self.head
+        self.head = (x + Snake._DX[self.direction], y + Snake._DY[self.direction])
 
 
 if __name__ == '__main__':